@@ -3,28 +3,71 @@
 Example usage of the Email Provider Filter data for implementing email validation.
 """
 
+import functools
 import json
+import os
+import sys
 import requests
-from typing import Dict, Set, Optional
+from types import MappingProxyType
+from typing import Dict, List, Mapping, Sequence, Optional
 from enum import Enum
 
+LOCAL_DATA_PATH = 'output/email_domains.json'
+
+# Second-level labels that country registries sell under (com.ar, net.ua, co.cc...).
+# A parent such as 'com.ar' is a registry suffix, not a provider, even when a
+# list carries it, so subdomain matching never stops there.
+REGISTRY_SUFFIX_LABELS = frozenset({'com', 'net', 'org', 'co', 'edu', 'gov', 'ac'})
+
 class EmailCategory(Enum):
     DISPOSABLE = "disposable"
     FREE = "free" 
     PAID_PERSONAL = "paid_personal"
     BUSINESS = "business"  # Not in our lists (assumed business)
 
+def _to_ascii_domain(domain: str) -> str:
+    """Return the punycode (xn--) form of an internationalized domain."""
+    try:
+        return domain.encode('idna').decode('ascii')
+    except UnicodeError:
+        # Not encodable (e.g. an empty label); leave it to match verbatim
+        return domain
+
+def _ascii_domains(domains: List[str]) -> List[str]:
+    """Convert a domain list to punycode, returning it unchanged when all-ASCII."""
+    if all(map(str.isascii, domains)):
+        return domains
+    return [domain if domain.isascii() else _to_ascii_domain(domain) for domain in domains]
+
+@functools.lru_cache(maxsize=2)
+def _load_local_lookup(path: str, mtime_ns: int) -> Dict[str, EmailCategory]:
+    """
+    Parse a local domains JSON file into a domain -> category lookup.
+    
+    Cached per (path, mtime_ns) so every EmailDomainFilter built from the same
+    file shares one lookup, while a regenerated file is picked up automatically.
+    The shared dict must not be mutated; callers outside the filter get a
+    read-only view through EmailDomainFilter.lookup.
+    """
+    with open(path, 'rb') as f:
+        data = json.load(f)
+    return EmailDomainFilter._build_lookup(data['domains'])
+
 class EmailDomainFilter:
     """Email domain filter using the consolidated domain lists."""
     
-    def __init__(self, data_source: str = "local"):
+    def __init__(self, data_source: str = "local", match_subdomains: bool = False):
         """
         Initialize the filter.
         
         Args:
             data_source: "local" to load from local files, "remote" to fetch from GitHub
+            match_subdomains: Also categorize subdomains of listed domains
+                (e.g. 'mx.mailinator.com' as disposable). Registry suffixes such as
+                'com.ar' are never matched as parents.
         """
-        self.categories: Dict[str, Set[str]] = {}
+        self._lookup: Dict[str, EmailCategory] = {}
+        self.match_subdomains = match_subdomains
         
         if data_source == "local":
             self._load_local_data()
@@ -34,14 +77,8 @@ class EmailDomainFilter:
     def _load_local_data(self):
         """Load domain data from local JSON file."""
         try:
-            with open('output/email_domains.json', 'r') as f:
-                data = json.load(f)
-                self.categories = {
-                    'disposable': set(data['domains']['disposable']),
-                    'free': set(data['domains']['free']),
-                    'paid_personal': set(data['domains']['paid_personal'])
-                }
-                print(f"Loaded {sum(len(domains) for domains in self.categories.values())} domains from local data")
+            self._lookup = _load_local_lookup(LOCAL_DATA_PATH, os.stat(LOCAL_DATA_PATH).st_mtime_ns)
+            print(f"Loaded {len(self._lookup)} domains from local data")
         except FileNotFoundError:
             print("Local data not found. Run 'python scripts/aggregate.py' first or use data_source='remote'")
             raise
@@ -53,16 +90,36 @@ class EmailDomainFilter:
             response = requests.get(url)
             response.raise_for_status()
             data = response.json()
-            self.categories = {
-                'disposable': set(data['domains']['disposable']),
-                'free': set(data['domains']['free']),
-                'paid_personal': set(data['domains']['paid_personal'])
-            }
-            print(f"Loaded {sum(len(domains) for domains in self.categories.values())} domains from remote data")
+            self._lookup = self._build_lookup(data['domains'])
+            print(f"Loaded {len(self._lookup)} domains from remote data")
         except requests.RequestException as e:
             print(f"Failed to load remote data: {e}")
             raise
     
+    @property
+    def lookup(self) -> Mapping[str, EmailCategory]:
+        """Read-only view of the domain -> category lookup."""
+        return MappingProxyType(self._lookup)
+    
+    @staticmethod
+    def _build_lookup(domains: Dict[str, List[str]]) -> Dict[str, EmailCategory]:
+        """
+        Merge the category lists into a single domain -> category map.
+        
+        Later updates win, so categories are applied from lowest to highest
+        precedence: paid personal, then free, then disposable.
+        
+        Keys are interned so repeated queries for interned strings compare
+        by identity before falling back to a full string comparison.
+        
+        Internationalized domains are stored in punycode, the form queries are
+        normalized to, so 'müll.email' and 'xn--mll-hoa.email' match alike.
+        """
+        lookup = dict.fromkeys(map(sys.intern, _ascii_domains(domains['paid_personal'])), EmailCategory.PAID_PERSONAL)
+        lookup.update(dict.fromkeys(map(sys.intern, _ascii_domains(domains['free'])), EmailCategory.FREE))
+        lookup.update(dict.fromkeys(map(sys.intern, _ascii_domains(domains['disposable'])), EmailCategory.DISPOSABLE))
+        return lookup
+    
     def categorize_domain(self, domain: str) -> EmailCategory:
         """
         Categorize an email domain.
@@ -74,15 +131,46 @@ class EmailDomainFilter:
             EmailCategory enum value
         """
         domain = domain.lower().strip()
+        if not domain.isascii():
+            domain = _to_ascii_domain(domain)
         
-        if domain in self.categories['disposable']:
-            return EmailCategory.DISPOSABLE
-        elif domain in self.categories['free']:
-            return EmailCategory.FREE
-        elif domain in self.categories['paid_personal']:
-            return EmailCategory.PAID_PERSONAL
-        else:
-            return EmailCategory.BUSINESS
+        category = self._lookup.get(domain)
+        if category is not None:
+            return category
+        if self.match_subdomains:
+            return self._categorize_parent_domain(domain)
+        return EmailCategory.BUSINESS
+    
+    def _categorize_parent_domain(self, domain: str) -> EmailCategory:
+        """Categorize a domain by its closest listed parent, never matching a bare TLD."""
+        labels = domain.split('.')
+        last = len(labels) - 2
+        # A two-label parent like 'com.ar' under a country TLD is a registry suffix
+        if last >= 1 and labels[last] in REGISTRY_SUFFIX_LABELS and len(labels[-1]) == 2:
+            last -= 1
+        for i in range(1, last + 1):
+            category = self._lookup.get('.'.join(labels[i:]))
+            if category is not None:
+                return category
+        return EmailCategory.BUSINESS
+    
+    def categorize_batch(self, emails: Sequence[str]) -> List[EmailCategory]:
+        """
+        Categorize many email addresses in a single pass.
+        
+        Args:
+            emails: Full email addresses; entries without '@' are treated as bare domains
+            
+        Returns:
+            List of EmailCategory values, in the same order as emails
+        """
+        # Subdomain matching and internationalized domains need the full per-domain path
+        if self.match_subdomains or not all(map(str.isascii, emails)):
+            return [self.categorize_domain(email.rpartition('@')[2]) for email in emails]
+        
+        get = self._lookup.get
+        business = EmailCategory.BUSINESS
+        return [get(email.rpartition('@')[2].lower().strip(), business) for email in emails]
     
     def is_business_email(self, email: str) -> bool:
         """
@@ -95,11 +183,12 @@ class EmailDomainFilter:
             True if likely business email, False otherwise
         """
         try:
-            domain = email.split('@')[1].lower()
-            category = self.categorize_domain(domain)
-            return category == EmailCategory.BUSINESS
-        except (IndexError, AttributeError):
+            _, sep, domain = email.rpartition('@')
+        except AttributeError:
             return False
+        if not sep:
+            return False
+        return self.categorize_domain(domain) == EmailCategory.BUSINESS
     
     def should_block_email(self, email: str, block_disposable: bool = True, 
                           block_free: bool = False, block_paid_personal: bool = False) -> tuple[bool, str]:
@@ -116,19 +205,23 @@ class EmailDomainFilter:
             Tuple of (should_block: bool, reason: str)
         """
         try:
-            domain = email.split('@')[1].lower()
-            category = self.categorize_domain(domain)
-            
-            if category == EmailCategory.DISPOSABLE and block_disposable:
-                return True, f"Disposable email domain: {domain}"
-            elif category == EmailCategory.FREE and block_free:
-                return True, f"Free email provider: {domain}"  
-            elif category == EmailCategory.PAID_PERSONAL and block_paid_personal:
-                return True, f"Paid personal email provider: {domain}"
-            else:
-                return False, f"Allowed email domain: {domain} ({category.value})"
-        except (IndexError, AttributeError):
+            _, sep, domain = email.rpartition('@')
+        except AttributeError:
             return True, "Invalid email format"
+        if not sep:
+            return True, "Invalid email format"
+        
+        domain = domain.lower()
+        category = self.categorize_domain(domain)
+        
+        if category == EmailCategory.DISPOSABLE and block_disposable:
+            return True, f"Disposable email domain: {domain}"
+        elif category == EmailCategory.FREE and block_free:
+            return True, f"Free email provider: {domain}"  
+        elif category == EmailCategory.PAID_PERSONAL and block_paid_personal:
+            return True, f"Paid personal email provider: {domain}"
+        else:
+            return False, f"Allowed email domain: {domain} ({category.value})"
 
 # Example usage and test cases
 def main():
@@ -185,7 +278,13 @@ def main():
         status = "✅ Business" if is_business else "❌ Not business"
         print(f"{email:<25} → {status}")
     
-    print(f"\n3. Email Filtering Examples:")
+    print(f"\n3. Batch Categorization:")
+    print("-" * 30)
+    valid_emails = [email for email in test_emails if '@' in email]
+    for email, category in zip(valid_emails, filter.categorize_batch(valid_emails)):
+        print(f"{email:<25} → {category.value}")
+    
+    print(f"\n4. Email Filtering Examples:")
     print("-" * 30)
     
     # Different filtering scenarios
@@ -3,37 +3,97 @@
 Main aggregation script to combine all sources and generate final output files.
 """
 
+import argparse
 import requests
+from requests.adapters import HTTPAdapter
 import json
 import os
-from typing import Set, Dict, List, Tuple
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Set, Dict, List, Tuple, Optional
 from datetime import datetime
 
+try:
+    import orjson
+except ImportError:  # optional; fall back to the stdlib encoder
+    orjson = None
+
+# Sources are IO-bound downloads, mostly from a couple of hosts
+MAX_DOWNLOAD_WORKERS = 8
+
+def parse_domains(text: str) -> Set[str]:
+    """Parse domains from text, one per line, ignoring empty lines and comments.
+
+    Lines containing CSV special characters (',' or '"') can't be valid
+    domains and are rejected, which lets the CSV writer skip quoting.
+    """
+    # Lowercase the whole buffer once instead of allocating a copy per line, and
+    # skip even that copy for already-normalized sources (islower() only scans)
+    if not text.islower():
+        text = text.lower()
+    lines = text.splitlines()
+    return {line for line in map(str.strip, lines)
+            if line and line[0] != '#' and ',' not in line and '"' not in line}
+
 def load_domains_from_file(file_path: str) -> Set[str]:
     """Load domains from a file, one per line, ignoring empty lines and comments."""
-    domains = set()
-    if os.path.exists(file_path):
-        with open(file_path, 'r', encoding='utf-8') as f:
-            for line in f:
-                line = line.strip()
-                if line and not line.startswith('#'):
-                    domains.add(line.lower())
-    return domains
-
-def download_source(url: str, output_file: str) -> None:
-    """Download a source file."""
+    if not os.path.exists(file_path):
+        return set()
+    with open(file_path, 'r', encoding='utf-8') as f:
+        return parse_domains(f.read())
+
+def write_json(file_path: str, data: Any, indent: bool = False) -> None:
+    """Write data as UTF-8 JSON, compact by default or with 2-space indentation.
+
+    Uses orjson when installed. The stdlib fallback is configured to emit
+    byte-identical output, so generated files don't churn between the two.
+    """
+    if orjson is not None:
+        with open(file_path, 'wb') as f:
+            f.write(orjson.dumps(data, option=orjson.OPT_INDENT_2 if indent else 0))
+    else:
+        with open(file_path, 'w', encoding='utf-8') as f:
+            if indent:
+                json.dump(data, f, indent=2, ensure_ascii=False)
+            else:
+                json.dump(data, f, separators=(',', ':'), ensure_ascii=False)
+
+def create_session() -> requests.Session:
+    """Create a session that keeps connections alive across source downloads."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=16, pool_maxsize=16)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+def fetch_domains(url: str, session: requests.Session, debug_file: Optional[str] = None) -> Set[str]:
+    """Download a source and parse its domains in memory, optionally saving the raw payload."""
     print(f"Downloading {url}...")
-    response = requests.get(url)
+    response = session.get(url)
     response.raise_for_status()
-    with open(output_file, 'w', encoding='utf-8') as f:
-        f.write(response.text)
-    print(f"Saved to {output_file}")
-
-def categorize_domains() -> Tuple[Set[str], Set[str], Set[str]]:
-    """Categorize domains into disposable, free, and paid personal."""
-
-    # Create temp directory
-    os.makedirs('temp', exist_ok=True)
+    if debug_file:
+        with open(debug_file, 'w', encoding='utf-8') as f:
+            f.write(response.text)
+        print(f"Saved to {debug_file}")
+    return parse_domains(response.text)
+
+def fetch_all_domains(urls: List[str], debug_files: Optional[List[str]] = None) -> List[Set[str]]:
+    """Fetch sources concurrently over a shared session, returning domain sets in url order."""
+    if debug_files is None:
+        debug_files = [None] * len(urls)
+    with create_session() as session, ThreadPoolExecutor(max_workers=MAX_DOWNLOAD_WORKERS) as executor:
+        # Iterating the results re-raises the first download failure, if any
+        return list(executor.map(lambda url, debug_file: fetch_domains(url, session, debug_file),
+                                 urls, debug_files))
+
+def categorize_domains(debug: bool = False) -> Tuple[Set[str], Set[str], Set[str]]:
+    """Categorize domains into disposable, free, and paid personal.
+
+    With debug enabled, raw source payloads are also saved under temp/.
+    """
+
+    if debug:
+        os.makedirs('temp', exist_ok=True)
 
     # Load sources configuration
     with open('sources/sources.json', 'r') as f:
@@ -42,14 +102,22 @@ def categorize_domains() -> Tuple[Set[str], Set[str], Set[str]]:
     # Track per-source domain sets for stats
     source_domains: Dict[str, Set[str]] = {}
 
+    # Fetch every remote source up front so downloads overlap
+    remote_sources = sources['disposable'] + sources['free_paid']
+    debug_files = None
+    if debug:
+        debug_files = ([f'temp/disposable_{i}.txt' for i in range(len(sources['disposable']))] +
+                       [f'temp/free_paid_{i}.txt' for i in range(len(sources['free_paid']))])
+    print(f"Downloading {len(remote_sources)} sources...")
+    fetched = fetch_all_domains([source['url'] for source in remote_sources], debug_files)
+    disposable_fetched = fetched[:len(sources['disposable'])]
+    free_paid_fetched = fetched[len(sources['disposable']):]
+
     # Download and combine all disposable domain sources
     print("Loading disposable domain sources...")
     disposable_domains = set()
 
-    for i, source in enumerate(sources['disposable']):
-        temp_file = f'temp/disposable_{i}.txt'
-        download_source(source['url'], temp_file)
-        domains = load_domains_from_file(temp_file)
+    for source, domains in zip(sources['disposable'], disposable_fetched):
         source_domains[source['name']] = domains
         disposable_domains.update(domains)
         print(f"  - {source['name']}: {len(domains):,} domains")
@@ -71,10 +139,7 @@ def categorize_domains() -> Tuple[Set[str], Set[str], Set[str]]:
     print("Loading free/paid email provider sources...")
     all_provider_domains = set()
 
-    for i, source in enumerate(sources['free_paid']):
-        temp_file = f'temp/free_paid_{i}.txt'
-        download_source(source['url'], temp_file)
-        domains = load_domains_from_file(temp_file)
+    for source, domains in zip(sources['free_paid'], free_paid_fetched):
         source_domains[source['name']] = domains
         all_provider_domains.update(domains)
         print(f"  - {source['name']}: {len(domains):,} domains")
@@ -87,11 +152,13 @@ def categorize_domains() -> Tuple[Set[str], Set[str], Set[str]]:
 
     # Remove disposable, paid personal, and allowlisted domains from all_providers
     print("Categorizing domains...")
-    free_domains = all_provider_domains - disposable_domains - paid_personal_domains - allowlist
+    # all_provider_domains isn't needed afterwards, so narrow it in place rather than
+    # building intermediate sets for each subtraction
+    free_domains = all_provider_domains
+    free_domains.difference_update(disposable_domains, paid_personal_domains, allowlist)
 
     # Remove paid personal and allowlisted domains from disposable lists
-    disposable_domains -= allowlist
-    disposable_domains -= paid_personal_domains
+    disposable_domains.difference_update(allowlist, paid_personal_domains)
 
     print(f"Final categorization:")
     print(f"  - Disposable: {len(disposable_domains):,} domains")
@@ -109,17 +176,23 @@ def write_source_stats(source_domains: Dict[str, Set[str]],
                        paid_personal: Set[str]) -> None:
     """Write per-source contribution stats to output/source_stats.json."""
     all_domains = disposable | free | paid_personal
-    seen: Set[str] = set()
     stats = {}
 
     # Process sources in order: largest first for unique-contribution calc
-    for name, domains in sorted(source_domains.items(), key=lambda x: -len(x[1])):
-        unique = domains - seen
-        seen.update(domains)
+    ordered_sources = sorted(source_domains.items(), key=lambda x: -len(x[1]))
+
+    # Credit each domain to the first source containing it. Applying sources in
+    # reverse lets earlier ones overwrite later ones, all within dict.update.
+    owner_of: Dict[str, str] = {}
+    for name, domains in reversed(ordered_sources):
+        owner_of.update(dict.fromkeys(domains, name))
+    unique_counts = Counter(owner_of.values())
+
+    for name, domains in ordered_sources:
         stats[name] = {
             'total': len(domains),
-            'unique_contribution': len(unique),
-            'overlap': len(domains) - len(unique),
+            'unique_contribution': unique_counts[name],
+            'overlap': len(domains) - unique_counts[name],
         }
 
     source_stats = {
@@ -129,23 +202,24 @@ def write_source_stats(source_domains: Dict[str, Set[str]],
     }
 
     os.makedirs('output', exist_ok=True)
-    with open('output/source_stats.json', 'w') as f:
-        json.dump(source_stats, f, indent=2)
+    write_json('output/source_stats.json', source_stats, indent=True)
     print("  Source stats written to output/source_stats.json")
 
-def compute_deltas(new_domains: Dict[str, List[str]]) -> Dict:
-    """Compare new domains against existing output files and write delta.json."""
-    old_domains: Dict[str, Set[str]] = {}
-    for category in ('disposable', 'free', 'paid_personal'):
-        path = f'output/{category}.txt'
-        old_domains[category] = load_domains_from_file(path)
+def compute_deltas(new_domains: Dict[str, Set[str]], old_domains: Dict[str, Set[str]]) -> Dict:
+    """Compare new domains against the previous output and write delta.json.
 
+    old_domains must be captured before the new outputs are written. Passing
+    the same set objects as new_domains marks a category as unchanged.
+    """
     delta: Dict = {'categories': {}, 'total_added': 0, 'total_removed': 0}
     for category in ('disposable', 'free', 'paid_personal'):
-        new_set = set(new_domains[category])
+        new_set = new_domains[category]
         old_set = old_domains[category]
-        added = len(new_set - old_set)
-        removed = len(old_set - new_set)
+        if new_set is old_set:
+            added = removed = 0
+        else:
+            added = len(new_set - old_set)
+            removed = len(old_set - new_set)
         delta['categories'][category] = {
             'added': added,
             'removed': removed,
@@ -156,40 +230,78 @@ def compute_deltas(new_domains: Dict[str, List[str]]) -> Dict:
 
     delta['total_domains'] = sum(d['total'] for d in delta['categories'].values())
 
-    with open('output/delta.json', 'w') as f:
-        json.dump(delta, f, indent=2)
+    write_json('output/delta.json', delta, indent=True)
     print(f"  Delta: +{delta['total_added']} / -{delta['total_removed']} domains")
     return delta
 
 
+def _write_txt(file_path: str, items: List[str]) -> None:
+    """Write items one per line with a single write call."""
+    with open(file_path, 'w') as f:
+        f.write('\n'.join(items) + '\n' if items else '')
+
+
 def generate_outputs(disposable: Set[str], free: Set[str], paid_personal: Set[str]) -> None:
     """Generate final output files in multiple formats."""
     
     os.makedirs('output', exist_ok=True)
     
-    # Prepare new domain data for comparison
-    new_domains = {
-        'disposable': sorted(list(disposable)),
-        'free': sorted(list(free)),
-        'paid_personal': sorted(list(paid_personal))
+    categories = {
+        'disposable': disposable,
+        'free': free,
+        'paid_personal': paid_personal
     }
     
     # Check if domain content has actually changed
     existing_timestamp = None
     content_changed = True  # Default to True if no existing file
+    old_domains: Optional[Dict[str, Set[str]]] = None
     
     if os.path.exists('output/email_domains.json'):
         try:
-            with open('output/email_domains.json', 'r') as f:
+            with open('output/email_domains.json', 'rb') as f:
                 existing_data = json.load(f)
                 existing_domains = existing_data.get('domains', {})
                 existing_timestamp = existing_data.get('metadata', {}).get('generated')
+                old_domains = {
+                    category: set(existing_domains.get(category, ()))
+                    for category in categories
+                }
                 
-                # Compare domain content (ignore metadata)
-                content_changed = existing_domains != new_domains
+                # Compare domain sets directly (ignore metadata) so no-op runs never sort
+                content_changed = old_domains != categories
         except (json.JSONDecodeError, KeyError):
             # If we can't parse existing file, assume content changed
             content_changed = True
+            old_domains = None
+    
+    # Only skip writing when every derived output is still present; a deleted file
+    # or a run that died after writing the JSON must not leave outputs stale
+    outputs_present = all(
+        os.path.exists(path)
+        for path in ['output/email_domains.csv'] + [f'output/{category}.txt' for category in categories]
+    )
+    
+    if not content_changed and outputs_present:
+        # Existing outputs (and their timestamp) already match, leave them untouched
+        print(f"Outputs up to date:")
+        print(f"  - Disposable: {len(disposable)} domains")
+        print(f"  - Free: {len(free)} domains")
+        print(f"  - Paid Personal: {len(paid_personal)} domains")
+        print(f"  - Total: {len(disposable) + len(free) + len(paid_personal)} domains")
+        print("  ✓ Domain content unchanged - output files left untouched")
+        compute_deltas(categories, categories)
+        return
+    
+    # Without a usable JSON, diff against the .txt outputs before they are overwritten
+    if old_domains is None:
+        old_domains = {
+            category: load_domains_from_file(f'output/{category}.txt')
+            for category in categories
+        }
+    
+    # Sort each category once and share the lists across every output format
+    new_domains = {category: sorted(domains) for category, domains in categories.items()}
     
     # Use existing timestamp if content hasn't changed, otherwise use current time
     if content_changed or existing_timestamp is None:
@@ -213,34 +325,19 @@ def generate_outputs(disposable: Set[str], free: Set[str], paid_personal: Set[st
     }
     
     # JSON output (most compact)
-    with open('output/email_domains.json', 'w') as f:
-        json.dump(data, f, separators=(',', ':'))
+    write_json('output/email_domains.json', data)
     
-    # CSV output for easy consumption
-    import csv
+    # CSV output for easy consumption; domains never need quoting (see parse_domains),
+    # so rows are joined directly, keeping the csv module's \r\n line endings
+    rows = ['domain,category']
+    for category, domains in new_domains.items():
+        rows.extend(f"{domain},{category}" for domain in domains)
     with open('output/email_domains.csv', 'w', newline='') as f:
-        writer = csv.writer(f)
-        writer.writerow(['domain', 'category'])
-        
-        for domain in sorted(disposable):
-            writer.writerow([domain, 'disposable'])
-        for domain in sorted(free):
-            writer.writerow([domain, 'free'])
-        for domain in sorted(paid_personal):
-            writer.writerow([domain, 'paid_personal'])
+        f.write('\r\n'.join(rows) + '\r\n')
     
     # Individual category files for convenience
-    with open('output/disposable.txt', 'w') as f:
-        for domain in sorted(disposable):
-            f.write(f"{domain}\n")
-    
-    with open('output/free.txt', 'w') as f:
-        for domain in sorted(free):
-            f.write(f"{domain}\n")
-    
-    with open('output/paid_personal.txt', 'w') as f:
-        for domain in sorted(paid_personal):
-            f.write(f"{domain}\n")
+    for category, domains in new_domains.items():
+        _write_txt(f'output/{category}.txt', domains)
     
     print(f"Generated outputs:")
     print(f"  - Disposable: {len(disposable)} domains")
@@ -251,15 +348,20 @@ def generate_outputs(disposable: Set[str], free: Set[str], paid_personal: Set[st
     if content_changed:
         print("  ✓ Domain content has changed - timestamp updated")
     else:
-        print("  ✓ Domain content unchanged - timestamp preserved")
+        print("  ✓ Domain content unchanged - missing outputs regenerated, timestamp preserved")
 
     # Compute deltas against previous output
-    delta = compute_deltas(new_domains)
+    delta = compute_deltas(categories, old_domains if content_changed else categories)
 
 def main():
+    parser = argparse.ArgumentParser(description="Aggregate email domain sources into output files.")
+    parser.add_argument('--debug', action='store_true',
+                        help="also save raw downloaded sources under temp/")
+    args = parser.parse_args()
+
     print("Starting email domain aggregation...")
     
-    disposable, free, paid_personal = categorize_domains()
+    disposable, free, paid_personal = categorize_domains(debug=args.debug)
     generate_outputs(disposable, free, paid_personal)
     
     print("Aggregation complete!")
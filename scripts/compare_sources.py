@@ -7,27 +7,74 @@ Handles large files efficiently without loading everything into memory.
 import requests
 import json
 import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
 from typing import Set, Dict, List
 
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
 def download_source(url: str, output_file: str) -> None:
-    """Download a source file if it doesn't exist locally."""
-    if not os.path.exists(output_file):
-        print(f"Downloading {url}...")
-        response = requests.get(url)
+    """Download a source file, revalidating a cached copy with its ETag."""
+    etag_file = output_file + '.etag'
+    headers = {}
+    if os.path.exists(output_file) and os.path.exists(etag_file):
+        with open(etag_file, 'r') as f:
+            headers['If-None-Match'] = f.read().strip()
+    
+    print(f"Downloading {url}...")
+    try:
+        response = requests.get(url, headers=headers, stream=True)
         response.raise_for_status()
-        with open(output_file, 'w', encoding='utf-8') as f:
-            f.write(response.text)
-        print(f"Saved to {output_file}")
+    except requests.RequestException as e:
+        # Offline re-runs keep working from the cached copy; only fail without one
+        if not os.path.exists(output_file):
+            raise
+        print(f"Warning: could not download {url} ({e}), using cached {output_file}")
+        return
+    
+    # Stream the body to disk in fixed-size chunks so peak memory stays bounded
+    with response:
+        if response.status_code == 304:
+            print(f"Not modified, using cached {output_file}")
+            return
+        
+        # Drop the old ETag first so an interrupted download is never revalidated
+        if os.path.exists(etag_file):
+            os.remove(etag_file)
+        with open(output_file, 'wb') as f:
+            for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                f.write(chunk)
+        
+        etag = response.headers.get('ETag')
+        if etag:
+            with open(etag_file, 'w') as f:
+                f.write(etag)
+    print(f"Saved to {output_file}")
 
 def load_domains_from_file(file_path: str) -> Set[str]:
     """Load domains from a file, one per line, ignoring empty lines and comments."""
-    domains = set()
-    with open(file_path, 'r', encoding='utf-8') as f:
-        for line in f:
-            line = line.strip()
-            if line and not line.startswith('#'):
-                domains.add(line.lower())
-    return domains
+    # Decode, lowercase and split the whole file in C rather than line by line;
+    # upstream lists are usually lowercase already, so only copy when needed
+    with open(file_path, 'rb') as f:
+        text = f.read().decode('utf-8')
+    if not text.islower():
+        text = text.lower()
+    lines = text.splitlines()
+    # Intern so a domain present in both sources is one shared object, letting the
+    # set difference/intersection in main() match it by identity
+    return {sys.intern(line) for line in map(str.strip, lines) if line and line[0] != '#'}
+
+def dump_domains(file_path: str, domains: Set[str]) -> None:
+    """Write domains sorted, one per line, in a single write.
+
+    The sorted list only lives for the duration of the call, so it is freed
+    before the next file is written.
+    """
+    with open(file_path, 'w') as f:
+        if domains:
+            f.write('\n'.join(sorted(domains)))
+            f.write('\n')
 
 def main():
     # Create temp directory for downloads
@@ -37,8 +84,14 @@ def main():
     disposable_url = "https://raw.githubusercontent.com/disposable-email-domains/disposable-email-domains/refs/heads/main/disposable_email_blocklist.conf"
     all_providers_url = "https://gist.githubusercontent.com/ammarshah/f5c2624d767f91a7cbdc4e54db8dd0bf/raw/660fd949eba09c0b86574d9d3aa0f2137161fc7c/all_email_provider_domains.txt"
     
-    download_source(disposable_url, 'temp/disposable.txt')
-    download_source(all_providers_url, 'temp/all_providers.txt')
+    # The two downloads are independent, so overlap their network waits
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        downloads = [
+            executor.submit(download_source, disposable_url, 'temp/disposable.txt'),
+            executor.submit(download_source, all_providers_url, 'temp/all_providers.txt'),
+        ]
+        for download in downloads:
+            download.result()
     
     # Load domain sets
     print("Loading domain sets...")
@@ -48,24 +101,23 @@ def main():
     print(f"Disposable domains: {len(disposable_domains)}")
     print(f"All provider domains: {len(all_provider_domains)}")
     
-    # Find domains in all_providers that are NOT in disposable
-    free_paid_candidates = all_provider_domains - disposable_domains
-    print(f"Free/Paid candidates (after removing disposable overlap): {len(free_paid_candidates)}")
+    # Find overlapping domains (for verification), iterating the smaller set
+    if len(disposable_domains) <= len(all_provider_domains):
+        overlap = disposable_domains.intersection(all_provider_domains)
+    else:
+        overlap = all_provider_domains.intersection(disposable_domains)
     
-    # Find overlapping domains (for verification)
-    overlap = disposable_domains & all_provider_domains
+    # Find domains in all_providers that are NOT in disposable; probing the overlap
+    # (at most the smaller set) touches fewer buckets than probing all of disposable
+    free_paid_candidates = all_provider_domains - overlap
+    print(f"Free/Paid candidates (after removing disposable overlap): {len(free_paid_candidates)}")
     print(f"Overlapping domains: {len(overlap)}")
     
     # Save results
     os.makedirs('output', exist_ok=True)
     
-    with open('output/disposable_domains.txt', 'w') as f:
-        for domain in sorted(disposable_domains):
-            f.write(f"{domain}\n")
-    
-    with open('output/free_paid_candidates.txt', 'w') as f:
-        for domain in sorted(free_paid_candidates):
-            f.write(f"{domain}\n")
+    dump_domains('output/disposable_domains.txt', disposable_domains)
+    dump_domains('output/free_paid_candidates.txt', free_paid_candidates)
     
     with open('output/overlap_analysis.txt', 'w') as f:
         f.write(f"Analysis Results:\n")
@@ -74,8 +126,8 @@ def main():
         f.write(f"Overlapping domains: {len(overlap)}\n")
         f.write(f"Free/Paid candidates: {len(free_paid_candidates)}\n\n")
         f.write("Sample overlapping domains:\n")
-        for domain in sorted(list(overlap)[:20]):
-            f.write(f"  {domain}\n")
+        # Take the sample straight from the set instead of listing the whole overlap
+        f.write(''.join('  ' + domain + '\n' for domain in sorted(islice(overlap, 20))))
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
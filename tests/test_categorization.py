@@ -3,43 +3,84 @@
 Test script to verify email domain categorization works correctly.
 """
 
+import functools
 import json
 import csv
 import os
-from typing import Dict, Set
+import sys
+from collections.abc import Mapping
+from typing import Dict, FrozenSet, Iterator, Tuple
 
-def load_domain_data() -> Dict[str, Set[str]]:
-    """Load domain data from output files."""
+try:
+    import orjson
+except ImportError:  # optional; fall back to the stdlib decoder
+    orjson = None
+
+# Run from the project root directory (parent of tests/) so output/ paths resolve
+script_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(script_dir)
+os.chdir(project_root)
+
+def load_category_file(file_path: str) -> FrozenSet[str]:
+    """Load one category's domains from a text output file."""
+    if not os.path.exists(file_path):
+        return frozenset()
+    
+    # Build the set in one comprehension rather than growing it with add().
+    # Lowercasing the buffer up front leaves strip() as the only per-line
+    # call, and it returns the line itself when there is nothing to strip.
+    # Generated outputs are already lowercase, so the copy is normally skipped.
+    with open(file_path, 'r') as f:
+        text = f.read()
+    if not text.islower():
+        text = text.lower()
+    lines = text.splitlines()
+    return frozenset(line for line in map(str.strip, lines) if line and line[0] != '#')
+
+class LazyCategories(Mapping):
+    """Category -> domains mapping that reads each output/<category>.txt on first access."""
+    
+    def __init__(self, categories: Tuple[str, ...]):
+        self._categories = categories
+        self._loaded: Dict[str, FrozenSet[str]] = {}
+    
+    def __getitem__(self, category: str) -> FrozenSet[str]:
+        if category not in self._categories:
+            raise KeyError(category)
+        if category not in self._loaded:
+            self._loaded[category] = load_category_file(f'output/{category}.txt')
+        return self._loaded[category]
     
-    # Get the project root directory (parent of tests/)
-    script_dir = os.path.dirname(os.path.abspath(__file__))
-    project_root = os.path.dirname(script_dir)
-    os.chdir(project_root)
+    def __contains__(self, category: object) -> bool:
+        # Membership is known up front; Mapping's default would parse the file
+        return category in self._categories
+    
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._categories)
+    
+    def __len__(self) -> int:
+        return len(self._categories)
+
+@functools.lru_cache(maxsize=1)
+def load_domain_data() -> Mapping[str, FrozenSet[str]]:
+    """Load domain data from output files, parsing them only once per run.
+    
+    The cached sets are shared by every test, so they are frozen to keep one
+    test from mutating another's data.
+    """
     
     # Load from JSON (most reliable)
     if os.path.exists('output/email_domains.json'):
-        with open('output/email_domains.json', 'r') as f:
-            data = json.load(f)
+        with open('output/email_domains.json', 'rb') as f:
+            data = orjson.loads(f.read()) if orjson is not None else json.load(f)
             return {
-                'disposable': set(data['domains']['disposable']),
-                'free': set(data['domains']['free']),
-                'paid_personal': set(data['domains']['paid_personal'])
+                'disposable': frozenset(data['domains']['disposable']),
+                'free': frozenset(data['domains']['free']),
+                'paid_personal': frozenset(data['domains']['paid_personal'])
             }
     
-    # Fallback to individual files
-    categories = {}
-    for category in ['disposable', 'free', 'paid_personal']:
-        file_path = f'output/{category}.txt'
-        domains = set()
-        if os.path.exists(file_path):
-            with open(file_path, 'r') as f:
-                for line in f:
-                    line = line.strip()
-                    if line and not line.startswith('#'):
-                        domains.add(line.lower())
-        categories[category] = domains
-    
-    return categories
+    # Fallback to individual files, each read only when a test first needs it
+    return LazyCategories(('disposable', 'free', 'paid_personal'))
 
 def test_categorization():
     """Test domain categorization with known examples."""
@@ -47,6 +88,13 @@ def test_categorization():
     print("Loading domain data...")
     categories = load_domain_data()
     
+    # Reverse index: one probe per test case instead of one per category.
+    # Built in reverse so the first category containing a domain wins;
+    # dict.fromkeys fills each category's entries in C.
+    lookup: Dict[str, str] = {}
+    for category, domains in reversed(list(categories.items())):
+        lookup.update(dict.fromkeys(domains, category))
+    
     # Test cases with expected categories
     test_cases = [
         # Disposable emails
@@ -83,11 +131,7 @@ def test_categorization():
     
     for domain, expected_category in test_cases:
         # Find which category the domain belongs to
-        actual_category = None
-        for category, domains in categories.items():
-            if domain.lower() in domains:
-                actual_category = category
-                break
+        actual_category = lookup.get(domain.lower())
         
         # Test result
         if actual_category == expected_category:
@@ -125,8 +169,10 @@ def test_no_overlaps():
     
     for i, cat1 in enumerate(category_names):
         for cat2 in category_names[i+1:]:
-            overlap = categories[cat1] & categories[cat2]
-            if overlap:
+            # isdisjoint stops at the first shared domain and allocates nothing;
+            # only build the intersection when there is something to report
+            if not categories[cat1].isdisjoint(categories[cat2]):
+                overlap = categories[cat1] & categories[cat2]
                 overlaps.append((cat1, cat2, overlap))
     
     if overlaps:
@@ -142,6 +188,69 @@ def test_no_overlaps():
         print("✅ No overlapping domains found")
         return True
 
+def test_filter_matching():
+    """Test EmailDomainFilter exact, parent-domain and batch matching."""
+    
+    print(f"\nTesting EmailDomainFilter matching...")
+    sys.path.insert(0, os.path.join(project_root, 'examples'))
+    from example_usage import REGISTRY_SUFFIX_LABELS, EmailCategory, EmailDomainFilter
+    
+    exact_filter = EmailDomainFilter(data_source="local")
+    subdomain_filter = EmailDomainFilter(data_source="local", match_subdomains=True)
+    
+    # (domain, expected without match_subdomains, expected with match_subdomains)
+    test_cases = [
+        # Exact matches are unaffected by the flag
+        ('gmail.com', EmailCategory.FREE, EmailCategory.FREE),
+        ('mailinator.com', EmailCategory.DISPOSABLE, EmailCategory.DISPOSABLE),
+        # Subdomains only match their listed parent when the flag is on
+        ('mx.mailinator.com', EmailCategory.BUSINESS, EmailCategory.DISPOSABLE),
+        # A bare TLD is never probed as a parent
+        ('com', EmailCategory.BUSINESS, EmailCategory.BUSINESS),
+        ('mail.propulsionhq.com', EmailCategory.BUSINESS, EmailCategory.BUSINESS),
+        # Punycode and Unicode spellings of the same domain match alike
+        ('desayuno-étnico.info', EmailCategory.FREE, EmailCategory.FREE),
+        ('xn--desayuno-tnico-jkb.info', EmailCategory.FREE, EmailCategory.FREE),
+    ]
+    # Registry suffixes (com.ar, net.ua...) are never matched as parents
+    test_cases += [
+        (f'foo.{label}.ar', EmailCategory.BUSINESS, EmailCategory.BUSINESS)
+        for label in sorted(REGISTRY_SUFFIX_LABELS)
+    ]
+    
+    passed = 0
+    failed = 0
+    
+    for domain, expected_exact, expected_subdomain in test_cases:
+        actual_exact = exact_filter.categorize_domain(domain)
+        actual_subdomain = subdomain_filter.categorize_domain(domain)
+        
+        if actual_exact == expected_exact and actual_subdomain == expected_subdomain:
+            status = "✅ PASS"
+            passed += 1
+        else:
+            status = "❌ FAIL"
+            failed += 1
+        
+        print(f"{status} | {domain:<27} | Exact: {actual_exact.value:<15} | Subdomains: {actual_subdomain.value}")
+    
+    # Batch results must match scalar categorization, in input order
+    emails = [f"user@{domain}" for domain, _, _ in test_cases] + ["User@GMAIL.COM "]
+    for domain_filter in (exact_filter, subdomain_filter):
+        expected = [domain_filter.categorize_domain(email.rpartition('@')[2]) for email in emails]
+        if domain_filter.categorize_batch(emails) == expected:
+            status = "✅ PASS"
+            passed += 1
+        else:
+            status = "❌ FAIL"
+            failed += 1
+        
+        print(f"{status} | categorize_batch            | match_subdomains={domain_filter.match_subdomains}")
+    
+    print(f"Results: {passed} passed, {failed} failed")
+    
+    return passed, failed
+
 if __name__ == "__main__":
     print("Email Provider Filter - Domain Categorization Test")
     print("=" * 60)
@@ -156,9 +265,12 @@ if __name__ == "__main__":
     # Test for overlaps
     no_overlaps = test_no_overlaps()
     
+    # Test filter matching
+    filter_passed, filter_failed = test_filter_matching()
+    
     # Overall result
     print("\n" + "=" * 60)
-    if failed == 0 and no_overlaps:
+    if failed == 0 and filter_failed == 0 and no_overlaps:
         print("🎉 ALL TESTS PASSED! Domain categorization is working correctly.")
         exit(0)
     else: